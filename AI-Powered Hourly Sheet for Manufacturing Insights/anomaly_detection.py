@@ -1,8 +1,7 @@
 import pandas as pd
 import numpy as np
+from joblib import parallel_backend
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-import random
 
 def prepare_anomaly_features(df):
     """
@@ -17,9 +16,6 @@ def prepare_anomaly_features(df):
     if df.empty or len(df) < 5:  # Need at least 5 records for meaningful detection
         return None, None
     
-    # Create a copy and ensure numeric columns
-    df_copy = df.copy()
-    
     # Select and prepare numeric features
     numeric_cols = [
         "Target_Output", "Actual_Output", "Cumulative_Output", 
@@ -27,47 +23,35 @@ def prepare_anomaly_features(df):
     ]
     
     # Check if all required columns exist
-    if not all(col in df_copy.columns for col in numeric_cols):
+    if not all(col in df.columns for col in numeric_cols):
         return None, None
     
-    # Group by machine_id to detect per-machine anomalies
-    grouped = df_copy.groupby("Machine_ID")
-    
-    all_features = []
-    machine_ids = []
-    
-    for machine_id, group in grouped:
-        if len(group) < 3:  # Skip machines with too few records
-            continue
-            
-        # Calculate features
-        features = pd.DataFrame()
-        
+    # Compute ratio features for all rows at once
+    a = df[numeric_cols].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
         # Efficiency ratio
-        features["efficiency"] = group["Actual_Output"] / group["Target_Output"]
-        features["efficiency"] = features["efficiency"].fillna(0).replace([np.inf, -np.inf], 0)
-        
+        efficiency = np.where(a[:, 0] > 0, a[:, 1] / a[:, 0], 0.0)
         # Defect rate
-        features["defect_rate"] = group["Defects"] / group["Actual_Output"]
-        features["defect_rate"] = features["defect_rate"].fillna(0).replace([np.inf, -np.inf], 0)
-        
+        defect_rate = np.where(a[:, 1] > 0, a[:, 3] / a[:, 1], 0.0)
         # Downtime per output
-        features["downtime_per_unit"] = group["Downtime_Minutes"] / group["Actual_Output"]
-        features["downtime_per_unit"] = features["downtime_per_unit"].fillna(0).replace([np.inf, -np.inf], 0)
-        
-        # Add machine_id for later reference
-        features["machine_id"] = machine_id
-        features["index"] = group.index
-        
-        all_features.append(features)
+        downtime_per_unit = np.where(a[:, 1] > 0, a[:, 4] / a[:, 1], 0.0)
+    
+    # Skip machines with too few records
+    sizes = df.groupby("Machine_ID", sort=False, observed=True)["Machine_ID"].transform("size").to_numpy()
+    mask = sizes >= 3
     
-    if not all_features:
+    if not mask.any():
         return None, None
-        
-    # Combine all machine features
-    feature_df = pd.concat(all_features, ignore_index=True)
     
-    return feature_df, df_copy
+    feature_df = pd.DataFrame({
+        "efficiency": efficiency[mask],
+        "defect_rate": defect_rate[mask],
+        "downtime_per_unit": downtime_per_unit[mask],
+        "machine_id": df["Machine_ID"].to_numpy()[mask],
+        "index": df.index.to_numpy()[mask]
+    })
+    
+    return feature_df, df
 
 def detect_anomalies(df):
     """
@@ -85,84 +69,163 @@ def detect_anomalies(df):
     if feature_df is None or feature_df.empty:
         return []
     
+    # Skip machines with too few records
+    feature_df = feature_df[feature_df.groupby("machine_id", sort=False)["machine_id"].transform("size") >= 5]
+    
+    if feature_df.empty:
+        return []
+    
     anomalies = []
     
-    # For each machine with sufficient data, detect anomalies
-    for machine_id in feature_df["machine_id"].unique():
-        machine_features = feature_df[feature_df["machine_id"] == machine_id].copy()
+    try:
+        # Get feature columns only
+        cols = ["efficiency", "defect_rate", "downtime_per_unit"]
+        X = feature_df[cols]
         
-        if len(machine_features) < 5:  # Skip if too few records
-            continue
-            
-        try:
-            # Get feature columns only
-            X = machine_features[["efficiency", "defect_rate", "downtime_per_unit"]]
-            
-            # Scale features
-            scaler = StandardScaler()
-            X_scaled = scaler.fit_transform(X)
-            
-            # Train isolation forest
-            model = IsolationForest(contamination=0.1, random_state=42)
+        # Scale features per machine so decision boundaries stay machine-relative
+        grouped = feature_df.groupby("machine_id", sort=False)[cols]
+        mu = grouped.transform("mean")
+        sd = grouped.transform("std", ddof=0).replace(0, 1)
+        # pandas hands back column-major arrays; sklearn works row-wise on samples
+        # and would otherwise make its own C-ordered copy
+        X_scaled = np.ascontiguousarray(((X - mu) / sd).to_numpy(dtype=np.float32))
+        
+        # Train a single isolation forest across all machines. The estimator's
+        # n_jobs alone does not select the joblib backend; the threading backend
+        # builds and traverses the trees in parallel (the tree code releases the
+        # GIL) without pickling X to worker processes.
+        with parallel_backend("threading", n_jobs=-1):
+            model = IsolationForest(
+                contamination=0.1,
+                n_estimators=200,
+                max_samples=min(256, X_scaled.shape[0]),
+                n_jobs=-1,
+                random_state=42
+            )
             preds = model.fit_predict(X_scaled)
+            # Higher score = more anomalous
+            scores = -model.score_samples(X_scaled)
+        
+        # -1 indicates anomaly
+        is_anomaly = preds == -1
+        if not is_anomaly.any():
+            return []
+        
+        # Map anomaly scores onto a 70-95% confidence range
+        s = scores[is_anomaly]
+        confidence = np.clip(70 + (s - s.min()) / (np.ptp(s) + 1e-9) * 25, 70, 95).round().astype(int)
+        anomaly_features = feature_df[is_anomaly].assign(confidence=confidence)
+        
+        # Historical averages per machine, computed once for all anomalies
+        tmp = original_df.assign(
+            _eff=original_df["Actual_Output"] / original_df["Target_Output"].replace(0, np.nan),
+            _def=original_df["Defects"] / original_df["Actual_Output"].replace(0, np.nan)
+        )
+        stats = tmp.groupby("Machine_ID", sort=False, observed=True).agg(
+            avg_eff=("_eff", "mean"),
+            avg_def=("_def", "mean"),
+            avg_dt=("Downtime_Minutes", "mean")
+        ).to_dict("index")
+        
+        # Get original records for these anomalies in a single slice
+        anomaly_features = anomaly_features.sort_values("machine_id", kind="mergesort")
+        anomaly_indices = anomaly_features["index"].to_numpy()
+        anomaly_records = original_df.loc[anomaly_indices, [
+            "Date", "Shift", "Machine_ID", "Target_Output",
+            "Actual_Output", "Defects", "Downtime_Minutes"
+        ]]
+        
+        anomaly_confidences = anomaly_features["confidence"].tolist()
+        
+        for anomaly_record, anomaly_confidence in zip(anomaly_records.to_dict("records"), anomaly_confidences):
+            machine_id = anomaly_record["Machine_ID"]
             
-            # -1 indicates anomaly
-            anomaly_indices = machine_features.iloc[np.where(preds == -1)[0]]["index"].values
+            # Determine reason for anomaly
+            reason = determine_anomaly_reason(anomaly_record, stats[machine_id])
             
-            # Get original records for these anomalies
-            for idx in anomaly_indices:
-                anomaly_record = original_df.loc[idx]
-                
-                # Determine reason for anomaly
-                reason = determine_anomaly_reason(anomaly_record, original_df)
-                
-                # Add to list of anomalies
-                anomalies.append({
-                    "machine_id": machine_id,
-                    "date": anomaly_record["Date"],
-                    "shift": anomaly_record["Shift"],
-                    "message": reason,
-                    "confidence": random.randint(70, 95)
-                })
-        except Exception as e:
-            print(f"Error detecting anomalies for machine {machine_id}: {str(e)}")
-            continue
+            # Add to list of anomalies
+            anomalies.append({
+                "machine_id": machine_id,
+                "date": anomaly_record["Date"],
+                "shift": anomaly_record["Shift"],
+                "message": reason,
+                "confidence": anomaly_confidence
+            })
+    except Exception as e:
+        print(f"Error detecting anomalies: {str(e)}")
     
     return anomalies
 
-def determine_anomaly_reason(record, df):
+# Reason codes returned by _reason_code
+REASON_DOWNTIME = 0
+REASON_EFFICIENCY = 1
+REASON_DEFECTS = 2
+REASON_LOW_OUTPUT = 3
+REASON_UNKNOWN = 4
+
+def _reason_code(actual, target, defects, downtime, avg_eff, avg_def, avg_dt):
+    """
+    Pick the most significant deviation of a record from its machine's averages.
+    Plain scalar arithmetic only, so it is cheap to call once per anomaly.
+    
+    Returns:
+        int: One of the REASON_* codes
+    """
+    if downtime > avg_dt * 2 and downtime > 10:
+        return REASON_DOWNTIME
+    
+    eff = actual / target if target > 0 else 0.0
+    drate = defects / actual if actual > 0 else 0.0
+    
+    if eff < avg_eff * 0.7 and avg_eff > 0:
+        return REASON_EFFICIENCY
+    
+    if drate > avg_def * 1.5 + 0.05 and drate > 0.1:
+        return REASON_DEFECTS
+    
+    if actual < target * 0.6 and target > 0:
+        return REASON_LOW_OUTPUT
+    
+    return REASON_UNKNOWN
+
+def determine_anomaly_reason(record, stats_row):
     """
     Determine the likely reason for an anomaly.
     
     Args:
-        record (Series): The anomalous record.
-        df (DataFrame): The full dataset for context.
+        record (dict): The anomalous record.
+        stats_row (dict): Historical averages for the record's machine
+            (avg_eff, avg_def, avg_dt).
         
     Returns:
         str: Description of the anomaly
     """
-    # Calculate performance metrics
-    efficiency = record["Actual_Output"] / record["Target_Output"] if record["Target_Output"] > 0 else 0
-    defect_rate = record["Defects"] / record["Actual_Output"] if record["Actual_Output"] > 0 else 0
+    actual = record["Actual_Output"]
+    target = record["Target_Output"]
+    defects = record["Defects"]
+    downtime = record["Downtime_Minutes"]
     
     # Get historical averages for this machine
-    machine_data = df[df["Machine_ID"] == record["Machine_ID"]]
-    avg_efficiency = (machine_data["Actual_Output"] / machine_data["Target_Output"]).mean()
-    avg_defect_rate = (machine_data["Defects"] / machine_data["Actual_Output"]).mean()
-    avg_downtime = machine_data["Downtime_Minutes"].mean()
+    avg_efficiency = stats_row["avg_eff"]
+    avg_defect_rate = stats_row["avg_def"]
+    avg_downtime = stats_row["avg_dt"]
     
     # Determine the most significant deviation
-    if record["Downtime_Minutes"] > (avg_downtime * 2) and record["Downtime_Minutes"] > 10:
-        return f"Unusual downtime: {record['Downtime_Minutes']} minutes vs. average {avg_downtime:.1f} minutes"
+    code = _reason_code(actual, target, defects, downtime, avg_efficiency, avg_defect_rate, avg_downtime)
+    
+    if code == REASON_DOWNTIME:
+        return f"Unusual downtime: {downtime} minutes vs. average {avg_downtime:.1f} minutes"
     
-    if efficiency < (avg_efficiency * 0.7) and avg_efficiency > 0:
+    if code == REASON_EFFICIENCY:
+        efficiency = actual / target if target > 0 else 0
         return f"Production efficiency dropped to {efficiency:.1%} vs. average {avg_efficiency:.1%}"
     
-    if defect_rate > (avg_defect_rate * 1.5 + 0.05) and defect_rate > 0.1:
+    if code == REASON_DEFECTS:
+        defect_rate = defects / actual if actual > 0 else 0
         return f"High defect rate: {defect_rate:.1%} vs. average {avg_defect_rate:.1%}"
     
-    if record["Actual_Output"] < (record["Target_Output"] * 0.6) and record["Target_Output"] > 0:
-        return f"Output significantly below target: {record['Actual_Output']} vs. target {record['Target_Output']}"
+    if code == REASON_LOW_OUTPUT:
+        return f"Output significantly below target: {actual} vs. target {target}"
     
     # Generic anomaly message if no specific reason found
     return "Unusual production pattern detected"
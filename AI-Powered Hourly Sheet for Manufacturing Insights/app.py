@@ -6,9 +6,11 @@ import os
 
 from data_manager import (
     load_data, 
-    save_data, 
+    append_data,
     search_data,
-    export_data_csv
+    export_data_csv,
+    get_data_fingerprint,
+    add_records
 )
 from grok_assistant import process_ai_query
 from prediction_models import predict_downtime
@@ -23,6 +25,16 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_data(show_spinner=False)
+def cached_detect_anomalies(data_fingerprint, _df):
+    """Run anomaly detection once per data content fingerprint (the frame itself is not hashed)."""
+    return detect_anomalies(_df)
+
+@st.cache_data(show_spinner=False)
+def cached_predict_downtime(data_fingerprint, machine_id, _df):
+    """Run downtime prediction once per data fingerprint and machine."""
+    return predict_downtime(_df, machine_id)
+
 # Initialize session state
 if "df" not in st.session_state:
     st.session_state.df = load_data()
@@ -88,14 +100,16 @@ with tab1:
                 "Downtime_Minutes": downtime,
                 "Downtime_Reason": downtime_reason,
                 "Remarks": remarks,
-                "Timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "Timestamp": datetime.now().replace(microsecond=0)
             }
             
-            # Add to dataframe
-            st.session_state.df = pd.concat([st.session_state.df, pd.DataFrame([new_record])], ignore_index=True)
+            # Add to dataframe, keeping its column types
+            new_df = pd.DataFrame([new_record])
+            previous_df = st.session_state.df
+            st.session_state.df = add_records(previous_df, new_df)
             
-            # Save data
-            save_data(st.session_state.df)
+            # Save only the new record
+            append_data(st.session_state.df, new_df, previous_df)
             
             st.success("Data submitted successfully!")
             
@@ -181,7 +195,11 @@ with tab4:
             if prediction_machine:
                 if prediction_machine in st.session_state.df["Machine_ID"].values:
                     with st.spinner("Analyzing downtime patterns..."):
-                        risk_score, hours = predict_downtime(st.session_state.df, prediction_machine)
+                        risk_score, hours = cached_predict_downtime(
+                            get_data_fingerprint(st.session_state.df),
+                            prediction_machine,
+                            st.session_state.df
+                        )
                         
                         # Display prediction
                         st.metric("Downtime Risk", f"{risk_score}%")
@@ -204,7 +222,10 @@ with tab4:
         if st.button("Detect Production Anomalies"):
             if not st.session_state.df.empty and len(st.session_state.df) > 5:  # Need some data for anomaly detection
                 with st.spinner("Detecting anomalies in production data..."):
-                    anomalies = detect_anomalies(st.session_state.df)
+                    anomalies = cached_detect_anomalies(
+                        get_data_fingerprint(st.session_state.df),
+                        st.session_state.df
+                    )
                     
                     if anomalies:
                         st.warning(f"Detected {len(anomalies)} anomalies in production data")
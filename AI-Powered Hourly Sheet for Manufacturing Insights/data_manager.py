@@ -4,80 +4,346 @@ import json
 import numpy as np
 from datetime import datetime
 import io
+import shutil
+import tempfile
+import threading
+import time
+import weakref
 
-# Define data file path
-DATA_FILE = "manufacturing_data.csv"
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+# Define data file paths (Parquet when pyarrow is installed, CSV otherwise).
+# The Parquet data file is a directory of part files so new records can be
+# appended without rewriting the existing data.
+LEGACY_DATA_FILE = "manufacturing_data.csv"
+DATA_FILE = "manufacturing_data.parquet" if PARQUET_AVAILABLE else LEGACY_DATA_FILE
+
+# zstd gives smaller files than snappy at similar decode speed
+PARQUET_COMPRESSION = "zstd"
+
+# Number of appended part files after which the data is rewritten as one file
+MAX_PART_FILES = 100
+
+# Serializes replacing the data file between sessions saving at the same time
+_SAVE_LOCK = threading.Lock()
+
+# Running production totals for the most recent data frame, updated on append.
+# Streamlit runs each session in its own thread, so access goes through the lock.
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+# Columns of the application's data file, in order
+DATA_COLUMNS = [
+    "Date", "Shift", "Machine_ID", "Operator_Name", "Product_Name",
+    "Target_Output", "Actual_Output", "Cumulative_Output", "Defects",
+    "Downtime_Minutes", "Downtime_Reason", "Remarks", "Timestamp"
+]
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = ["Machine_ID", "Operator_Name", "Shift", "Product_Name", "Downtime_Reason"]
+
+# Hourly counts never need 64-bit integers
+NUMERIC_DTYPES = {
+    "Target_Output": "int32",
+    "Actual_Output": "int32",
+    "Cumulative_Output": "int32",
+    "Defects": "int32",
+    "Downtime_Minutes": "int16"
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 def load_data():
     """
-    Load manufacturing hourly sheet data from CSV file.
-    If file doesn't exist, create an empty DataFrame with required columns.
+    Load manufacturing hourly sheet data from the data file.
+    Falls back to the legacy CSV file if no Parquet file has been written yet.
+    If neither exists, create an empty DataFrame with required columns.
     """
     try:
-        if os.path.exists(DATA_FILE):
-            df = pd.read_csv(DATA_FILE)
+        if os.path.exists(DATA_FILE) or os.path.exists(LEGACY_DATA_FILE):
+            if PARQUET_AVAILABLE and os.path.exists(DATA_FILE):
+                df = pd.read_parquet(DATA_FILE, engine="pyarrow", memory_map=True)
+            else:
+                df = pd.read_csv(LEGACY_DATA_FILE)
+            
+            # Store repeated text values as categories
+            for col in CATEGORICAL_COLUMNS:
+                if col in df.columns:
+                    df[col] = df[col].astype("category")
+            
+            # Narrow integer columns
+            narrow_numeric_columns(df)
+            
+            # Parse timestamps so comparisons and sorting work on datetime64 values
+            if "Timestamp" in df.columns:
+                df["Timestamp"] = _parse_timestamps(df["Timestamp"])
+            
+            # Keep rows grouped by machine so per-machine groupbys scan contiguous
+            # runs; mergesort is stable and preserves time order within a machine
+            if "Machine_ID" in df.columns:
+                df.sort_values("Machine_ID", kind="mergesort", inplace=True)
+                df.reset_index(drop=True, inplace=True)
+            
             return df
         else:
             # Create empty DataFrame with required columns
-            columns = [
-                "Date", "Shift", "Machine_ID", "Operator_Name", "Product_Name",
-                "Target_Output", "Actual_Output", "Cumulative_Output", "Defects",
-                "Downtime_Minutes", "Downtime_Reason", "Remarks", "Timestamp"
-            ]
-            return pd.DataFrame(columns=columns)
+            return empty_data_frame()
     except Exception as e:
         print(f"Error loading data: {str(e)}")
         # Return empty DataFrame in case of error
-        columns = [
-            "Date", "Shift", "Machine_ID", "Operator_Name", "Product_Name",
-            "Target_Output", "Actual_Output", "Cumulative_Output", "Defects",
-            "Downtime_Minutes", "Downtime_Reason", "Remarks", "Timestamp"
-        ]
-        return pd.DataFrame(columns=columns)
+        return empty_data_frame()
+
+def _parse_timestamps(timestamps):
+    """
+    Parse a Timestamp column, trying TIMESTAMP_FORMAT first and then
+    per-value format inference. If some values still cannot be parsed the
+    column is returned unchanged, so they are not replaced by NaT and lost
+    on the next save.
+    """
+    try:
+        return pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT, cache=True)
+    except (ValueError, TypeError):
+        pass
+    
+    try:
+        return pd.to_datetime(timestamps, format="mixed", cache=True)
+    except (ValueError, TypeError):
+        return timestamps
+
+def empty_data_frame():
+    """
+    Create an empty data frame with the column types load_data produces, so
+    records added to it keep numeric (and categorical) columns rather than
+    falling back to object.
+    
+    Returns:
+        DataFrame: An empty frame with DATA_COLUMNS
+    """
+    df = pd.DataFrame(columns=DATA_COLUMNS)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    return narrow_numeric_columns(df)
+
+def narrow_numeric_columns(df):
+    """
+    Cast the count columns of df to their NUMERIC_DTYPES widths in place.
+    Columns with missing values, or with values that are not whole numbers
+    within the range of the narrow type, are left as they are.
+    
+    Args:
+        df (DataFrame): Manufacturing records.
+        
+    Returns:
+        DataFrame: df, for chaining
+    """
+    unfit = find_unfit_numeric_columns(df)
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col in df.columns and col not in unfit and df[col].notna().all():
+            df[col] = df[col].astype(dtype)
+    return df
+
+def find_unfit_numeric_columns(df):
+    """
+    Find count columns holding values that cannot be stored at their
+    NUMERIC_DTYPES width: non-numbers, fractions, or values out of range.
+    Missing values are ignored.
+    
+    Args:
+        df (DataFrame): Manufacturing records.
+        
+    Returns:
+        list: Names of the offending columns
+    """
+    unfit = []
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col not in df.columns:
+            continue
+        
+        present = df[col].dropna()
+        if present.empty:
+            continue
+        
+        values = pd.to_numeric(present, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        limits = np.iinfo(dtype)
+        if (np.isnan(values).any() or (values != np.floor(values)).any()
+                or values.min() < limits.min or values.max() > limits.max):
+            unfit.append(col)
+    return unfit
+
+def add_records(df, new_df):
+    """
+    Concatenate new records onto the data while keeping its column types.
+    Count columns are narrowed, and categorical columns are extended with any
+    new values, so pd.concat does not fall back to plain string columns.
+    
+    Args:
+        df (DataFrame): The manufacturing data.
+        new_df (DataFrame): The records to add.
+        
+    Returns:
+        DataFrame: The combined data
+    """
+    new_df = narrow_numeric_columns(new_df.copy())
+    
+    extended = {}
+    for col in CATEGORICAL_COLUMNS:
+        if col not in df.columns or col not in new_df.columns or not isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        
+        # Append unseen values so the existing category codes stay valid
+        categories = df[col].cat.categories
+        new_values = pd.Index(new_df[col].dropna().unique()).difference(categories)
+        if len(new_values) > 0:
+            categories = categories.append(new_values)
+            extended[col] = pd.CategoricalDtype(categories)
+        new_df[col] = new_df[col].astype(pd.CategoricalDtype(categories))
+    
+    if extended:
+        df = df.astype(extended)
+    
+    return pd.concat([df, new_df], ignore_index=True)
 
 def save_data(df):
     """
-    Save manufacturing data to CSV file.
+    Save manufacturing data to the data file.
     """
     try:
-        df.to_csv(DATA_FILE, index=False)
+        if PARQUET_AVAILABLE:
+            # Write into a fresh directory first so a failed write leaves the old
+            # data intact; the name is unique so concurrent saves never share it
+            tmp_dir = tempfile.mkdtemp(
+                prefix=os.path.basename(DATA_FILE) + ".",
+                suffix=".tmp",
+                dir=os.path.dirname(os.path.abspath(DATA_FILE))
+            )
+            try:
+                df.to_parquet(_part_path(tmp_dir, 0), engine="pyarrow", compression=PARQUET_COMPRESSION, index=False)
+                
+                with _SAVE_LOCK:
+                    if os.path.isdir(DATA_FILE):
+                        shutil.rmtree(DATA_FILE)
+                    elif os.path.exists(DATA_FILE):
+                        os.remove(DATA_FILE)
+                    os.rename(tmp_dir, DATA_FILE)
+            finally:
+                # Only left behind if the write or the swap failed
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            df.to_csv(DATA_FILE, index=False, date_format=TIMESTAMP_FORMAT)
         return True
     except Exception as e:
         print(f"Error saving data: {str(e)}")
         return False
 
+def append_data(df, new_df, previous_df=None):
+    """
+    Append new records to the data file without rewriting existing records.
+    
+    Args:
+        df (DataFrame): The full manufacturing data, already including new_df.
+        new_df (DataFrame): The records to append.
+        previous_df (DataFrame): The data before new_df was added, used to
+            update the running production totals. Without it they are
+            recomputed on the next get_production_stats call.
+        
+    Returns:
+        bool: True if the records were stored
+    """
+    try:
+        _update_production_stats(previous_df, df, new_df)
+        
+        # Match the column widths of the stored data
+        new_df = narrow_numeric_columns(new_df.copy())
+        
+        if PARQUET_AVAILABLE:
+            # No Parquet data written yet (or a legacy single file): write everything
+            if not os.path.isdir(DATA_FILE):
+                return save_data(df)
+            
+            # Compact once too many small part files have accumulated
+            if len(os.listdir(DATA_FILE)) >= MAX_PART_FILES:
+                return save_data(df)
+            
+            new_df.to_parquet(_part_path(DATA_FILE, time.time_ns()), engine="pyarrow", compression=PARQUET_COMPRESSION, index=False)
+        else:
+            new_df.to_csv(DATA_FILE, mode="a", header=not os.path.exists(DATA_FILE), index=False, date_format=TIMESTAMP_FORMAT)
+        return True
+    except Exception as e:
+        print(f"Error appending data: {str(e)}")
+        return False
+
+def _part_path(directory, sequence):
+    """
+    Build the path of a Parquet part file. Names sort in write order.
+    """
+    return os.path.join(directory, f"part-{sequence:020d}.parquet")
+
 def search_data(df, date=None, shift=None, machine_id=None, operator_name=None):
     """
     Search manufacturing data based on provided criteria.
     Returns filtered DataFrame.
     """
-    # Create a copy to avoid modifying the original
-    result_df = df.copy()
+    # Combine all filters into one mask and slice once
+    mask = np.ones(len(df), dtype=bool)
     
     # Apply filters if provided
     if date:
-        result_df = result_df[result_df["Date"] == date]
+        mask &= (df["Date"] == date).to_numpy()
     
     if shift:
-        result_df = result_df[result_df["Shift"] == shift]
+        mask &= (df["Shift"] == shift).to_numpy()
     
     if machine_id:
-        result_df = result_df[result_df["Machine_ID"].str.contains(machine_id, case=False, na=False)]
+        mask &= _match(df["Machine_ID"], machine_id)
     
     if operator_name:
-        result_df = result_df[result_df["Operator_Name"].str.contains(operator_name, case=False, na=False)]
+        mask &= _match(df["Operator_Name"], operator_name)
     
-    return result_df
+    return df[mask]
 
-def export_data_csv(df):
+def _match(col, query):
+    """
+    Case-insensitive substring match on a text column, as a boolean array.
+    For categorical columns only the categories are scanned and the result
+    is mapped back to the rows through the category codes.
+    """
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        hits = col.cat.categories.str.contains(query, case=False, na=False, regex=False)
+        code_hits = np.flatnonzero(np.asarray(hits))
+        return np.isin(col.cat.codes.to_numpy(), code_hits)
+    return col.str.contains(query, case=False, na=False, regex=False).to_numpy(dtype=bool)
+
+def export_data_csv(df, chunk_rows=50_000):
     """
     Export data to CSV format.
-    Returns CSV data as string.
+    Rows are written in chunks so only one chunk is formatted as text at a time.
+    Returns CSV data as UTF-8 encoded bytes.
     """
-    output = io.StringIO()
-    df.to_csv(output, index=False)
+    output = io.BytesIO()
+    
+    # Always write at least one (possibly empty) chunk so the header is included
+    for start in range(0, max(len(df), 1), chunk_rows):
+        df.iloc[start:start + chunk_rows].to_csv(
+            output, index=False, header=(start == 0), date_format=TIMESTAMP_FORMAT
+        )
+    
     return output.getvalue()
 
+def get_data_fingerprint(df):
+    """
+    Fingerprint of the data content for use as a cache key.
+    Returns the row count and a hash over every value, so a corrected
+    re-import with the same rows and timestamps still changes it.
+    """
+    if df.empty:
+        return (0, 0)
+    return (len(df), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
 def get_machine_data(df, machine_id):
     """
     Get all data for a specific machine.
@@ -97,22 +363,81 @@ def get_operator_data(df, operator_name):
 def get_production_stats(df):
     """
     Calculate and return summary statistics for production data.
+    Uses the running totals when they are up to date for df.
     """
     if df.empty:
         return {}
     
+    with _STATS_LOCK:
+        if not _stats_describe(df):
+            _reset_production_stats(df)
+        
+        total_production = _STATS["total_production"]
+        total_target = _STATS["total_target"]
+        total_defects = _STATS["total_defects"]
+        total_downtime = _STATS["total_downtime"]
+        machines = len(_STATS["machine_ids"])
+        operators = len(_STATS["operator_names"])
+    
     stats = {
-        "total_production": df["Actual_Output"].sum(),
-        "total_defects": df["Defects"].sum(),
-        "total_downtime": df["Downtime_Minutes"].sum(),
-        "efficiency": (df["Actual_Output"].sum() / df["Target_Output"].sum() * 100) if df["Target_Output"].sum() > 0 else 0,
-        "defect_rate": (df["Defects"].sum() / df["Actual_Output"].sum() * 100) if df["Actual_Output"].sum() > 0 else 0,
-        "machines": df["Machine_ID"].nunique(),
-        "operators": df["Operator_Name"].nunique()
+        "total_production": total_production,
+        "total_defects": total_defects,
+        "total_downtime": total_downtime,
+        "efficiency": (total_production / total_target * 100) if total_target > 0 else 0,
+        "defect_rate": (total_defects / total_production * 100) if total_production > 0 else 0,
+        "machines": machines,
+        "operators": operators
     }
     
     return stats
 
+def _stats_describe(df):
+    """
+    Check whether the running totals were computed for df. Call with
+    _STATS_LOCK held.
+    """
+    df_ref = _STATS.get("df_ref")
+    return df_ref is not None and df_ref() is df and _STATS["rows"] == len(df)
+
+def _reset_production_stats(df):
+    """
+    Recompute the running production totals from the full data. Call with
+    _STATS_LOCK held.
+    """
+    _STATS.clear()
+    _STATS.update({
+        "df_ref": weakref.ref(df),
+        "rows": len(df),
+        "total_production": df["Actual_Output"].sum(),
+        "total_target": df["Target_Output"].sum(),
+        "total_defects": df["Defects"].sum(),
+        "total_downtime": df["Downtime_Minutes"].sum(),
+        "machine_ids": set(df["Machine_ID"].dropna().unique()),
+        "operator_names": set(df["Operator_Name"].dropna().unique())
+    })
+
+def _update_production_stats(previous_df, df, new_df):
+    """
+    Add newly appended records to the running production totals.
+    The totals are only updated if they were computed for previous_df and df
+    is previous_df plus new_df; otherwise they are recomputed on the next
+    get_production_stats call.
+    """
+    with _STATS_LOCK:
+        if (previous_df is None or not _stats_describe(previous_df)
+                or len(previous_df) + len(new_df) != len(df)):
+            _STATS.clear()
+            return
+        
+        _STATS["df_ref"] = weakref.ref(df)
+        _STATS["rows"] = len(df)
+        _STATS["total_production"] += new_df["Actual_Output"].sum()
+        _STATS["total_target"] += new_df["Target_Output"].sum()
+        _STATS["total_defects"] += new_df["Defects"].sum()
+        _STATS["total_downtime"] += new_df["Downtime_Minutes"].sum()
+        _STATS["machine_ids"].update(new_df["Machine_ID"].dropna().unique())
+        _STATS["operator_names"].update(new_df["Operator_Name"].dropna().unique())
+
 def get_recent_downtime_reasons(df, limit=5):
     """
     Get most recent downtime reasons from the data.
@@ -121,12 +446,19 @@ def get_recent_downtime_reasons(df, limit=5):
         return []
     
     # Filter rows with downtime > 0 and non-empty reason
-    downtime_df = df[(df["Downtime_Minutes"] > 0) & (df["Downtime_Reason"].notna()) & (df["Downtime_Reason"] != "")]
+    mask = (df["Downtime_Minutes"] > 0) & df["Downtime_Reason"].notna() & (df["Downtime_Reason"] != "")
+    downtime_df = df.loc[mask, ["Date", "Machine_ID", "Downtime_Minutes", "Downtime_Reason", "Timestamp"]]
     
     if downtime_df.empty:
         return []
     
-    # Sort by timestamp (most recent first) and take top 'limit' entries
-    recent_reasons = downtime_df.sort_values("Timestamp", ascending=False).head(limit)
+    # nlargest needs comparable timestamps (load_data already parses them)
+    if not pd.api.types.is_datetime64_any_dtype(downtime_df["Timestamp"]):
+        downtime_df = downtime_df.assign(
+            Timestamp=pd.to_datetime(downtime_df["Timestamp"], format=TIMESTAMP_FORMAT, errors="coerce", cache=True)
+        )
+    
+    # Take the 'limit' most recent entries without sorting the whole frame
+    recent_reasons = downtime_df.nlargest(limit, "Timestamp")
     
-    return recent_reasons[["Date", "Machine_ID", "Downtime_Minutes", "Downtime_Reason"]].to_dict("records")
+    return recent_reasons.drop(columns="Timestamp").to_dict("records")
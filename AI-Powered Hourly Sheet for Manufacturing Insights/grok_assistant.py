@@ -1,9 +1,178 @@
 import os
+import re
+import threading
 import pandas as pd
 import json
 from datetime import datetime
 # Removed OpenAI import since we're using direct data analysis
 
+# Keywords recognised in assistant queries
+QUERY_KEYWORDS = [
+    "summary", "overview", "stats", "statistics", "machine", "operator",
+    "defect", "quality", "downtime", "output", "production", "produce", "units",
+    "last shift", "previous shift", "morning", "afternoon", "night",
+    "today", "yesterday", "date", "most"
+]
+
+# Single-pass matcher for all keywords. The lookahead lets matches overlap, and
+# longer keywords are tried first so each position reports its longest keyword.
+_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(k) for k in sorted(QUERY_KEYWORDS, key=len, reverse=True)) + "))"
+)
+
+# Downtime reason categories used by analyze_production_issue, matched as
+# case-insensitive substrings
+_CATEGORY_PATTERNS = {
+    "maintenance": re.compile(r"maintenance|breakdown|failure|malfunction", re.IGNORECASE),
+    "tooling": re.compile(r"tool|part|component|worn|broken", re.IGNORECASE),
+    "calibration": re.compile(r"calibration|alignment|quality|tolerance", re.IGNORECASE),
+    "material": re.compile(r"material|raw|input|feed", re.IGNORECASE),
+    "operator": re.compile(r"operator|human|setup|configuration", re.IGNORECASE),
+    "control": re.compile(r"software|control|program|plc|system", re.IGNORECASE),
+}
+
+# Suggested solutions for each downtime reason category
+_SOLUTIONS = {
+    # General maintenance issues
+    "maintenance": [
+        "1. Schedule immediate preventive maintenance to check mechanical components, electrical systems, and control units.",
+        "2. Review maintenance logs to identify recurring patterns and address root causes.",
+        "3. Consider implementing condition-based monitoring to detect early signs of failure."
+    ],
+    # Tool or part issues
+    "tooling": [
+        "1. Replace the affected tools or parts with new or reconditioned components.",
+        "2. Check alignment and calibration of all related components.",
+        "3. Review tool replacement schedule and adjust based on wear patterns."
+    ],
+    # Calibration or quality issues
+    "calibration": [
+        "1. Perform full machine calibration according to manufacturer specifications.",
+        "2. Check and adjust alignment of critical components.",
+        "3. Implement more frequent quality checks during production runs."
+    ],
+    # Material-related issues
+    "material": [
+        "1. Inspect material quality and ensure it meets specifications.",
+        "2. Check material feeding mechanism for obstructions or wear.",
+        "3. Consider adjusting machine settings to accommodate material variations."
+    ],
+    # Operator-related issues
+    "operator": [
+        "1. Provide additional training for operators on proper machine setup and operation.",
+        "2. Review and update standard operating procedures for clarity.",
+        "3. Implement checklist system for machine setup and changeover."
+    ],
+    # Software or control issues
+    "control": [
+        "1. Check and update machine control software/firmware to latest version.",
+        "2. Verify sensor functions and replace any malfunctioning sensors.",
+        "3. Backup and restore control programs after validating their integrity."
+    ],
+}
+
+# Default solutions if no specific category matches
+_DEFAULT_SOLUTIONS = [
+    "1. Perform general inspection of the machine and its components.",
+    "2. Review operating conditions and parameters for abnormalities.",
+    "3. Consult machine manufacturer documentation for troubleshooting guidance."
+]
+
+# Values derived from a data frame (GroupBy objects and the like) are cached
+# on the frame itself under this attribute, together with its row count so
+# rows added in place start a fresh cache. GroupBy objects reference their
+# frame, so a module-level map (even one holding only a weak reference to
+# the frame) would keep every frame alive; stored on the frame, the cache is
+# freed with it.
+_FRAME_CACHE_ATTR = "_analysis_cache"
+
+# Streamlit runs each session in its own thread
+_FRAME_CACHE_LOCK = threading.Lock()
+
+def get_cached_value(df, key, build):
+    """
+    Return the value cached under key for this data frame, calling build()
+    to compute it on first use.
+    
+    Args:
+        df (DataFrame): The manufacturing data the value is derived from.
+        key (tuple): Identifies the value, e.g. ("groupby", "Machine_ID").
+        build (callable): Computes the value from df.
+        
+    Returns:
+        object: The cached value
+    """
+    with _FRAME_CACHE_LOCK:
+        entry = df.__dict__.get(_FRAME_CACHE_ATTR)
+        if entry is None or entry["rows"] != len(df):
+            entry = {"rows": len(df), "values": {}}
+            # Bypass DataFrame.__setattr__, which treats new names as columns
+            object.__setattr__(df, _FRAME_CACHE_ATTR, entry)
+        
+        values = entry["values"]
+    
+    if key not in values:
+        # Built outside the lock; if two threads race, both results describe
+        # the same frame and the first one stored wins
+        values.setdefault(key, build())
+    
+    return values[key]
+
+def get_groupby(df, col):
+    """
+    Return df.groupby(col, observed=True), reusing the GroupBy object built
+    for the same frame by an earlier call.
+    
+    Args:
+        df (DataFrame): The manufacturing data.
+        col (str): The column to group by.
+        
+    Returns:
+        DataFrameGroupBy: The cached GroupBy object
+    """
+    return get_cached_value(df, ("groupby", col), lambda: df.groupby(col, observed=True))
+
+def build_query_indexes(df):
+    """
+    Build lookup indexes used to resolve machine and operator names in queries.
+    The indexes are built once per data frame.
+    
+    Args:
+        df (DataFrame): The manufacturing data.
+        
+    Returns:
+        tuple: (machine_index, operator_index) - lower-cased name to name mappings
+    """
+    return get_cached_value(df, ("query_indexes",), lambda: (
+        {str(m).lower(): m for m in df['Machine_ID'].dropna().unique()},
+        {str(o).lower(): o for o in df['Operator_Name'].dropna().unique()}
+    ))
+
+def find_query_keywords(query_lower):
+    """
+    Return the set of QUERY_KEYWORDS that occur in a lower-cased query.
+    """
+    return set(_KEYWORD_PATTERN.findall(query_lower))
+
+def find_name_in_query(query_lower, tokens, index):
+    """
+    Find a machine or operator name mentioned in a query.
+    Whole-word matches are looked up directly; names containing spaces or
+    punctuation fall back to a substring check against the index keys.
+    
+    Returns:
+        str: The matching name, or None
+    """
+    for token in tokens:
+        if token in index:
+            return index[token]
+    
+    for key, name in index.items():
+        if key in query_lower:
+            return name
+    
+    return None
+
 def process_ai_query(query, df):
     """
     Process a natural language query about manufacturing data without using external API.
@@ -22,129 +191,126 @@ def process_ai_query(query, df):
     
     # Standardize query for easier matching
     query_lower = query.lower().strip()
+    tokens = re.findall(r"[\w\-]+", query_lower)
+    hits = find_query_keywords(query_lower)
     
     try:
+        machine_index, operator_index = build_query_indexes(df)
+        
+        machine_id = find_name_in_query(query_lower, tokens, machine_index) if "machine" in hits else None
+        operator_name = find_name_in_query(query_lower, tokens, operator_index) if "operator" in hits else None
+        
         # BASIC DATA SUMMARY
-        if any(keyword in query_lower for keyword in ["summary", "overview", "stats", "statistics"]):
-            return generate_data_summary(df)
+        if hits & {"summary", "overview", "stats", "statistics"}:
+            return get_cached_value(df, ("summary", "data"), lambda: generate_data_summary(df))
         
         # MACHINE SPECIFIC QUERIES
-        elif "machine" in query_lower and any(machine_id.lower() in query_lower for machine_id in df['Machine_ID'].unique()):
-            # Extract machine ID from query
-            machine_id = None
-            for m_id in df['Machine_ID'].unique():
-                if m_id.lower() in query_lower:
-                    machine_id = m_id
-                    break
-                    
-            if machine_id:
-                # Filter data for this machine
-                machine_data = df[df['Machine_ID'] == machine_id]
-                
-                # Check for defects query
-                if "defect" in query_lower:
-                    # Check if query is for a specific date
-                    if "today" in query_lower:
-                        today = datetime.now().strftime("%Y-%m-%d")
-                        today_data = machine_data[machine_data['Date'] == today]
-                        if not today_data.empty:
-                            total_defects = today_data['Defects'].sum()
-                            return f"Machine {machine_id} had {total_defects} defects today."
-                        else:
-                            return f"No data available for Machine {machine_id} today."
+        elif machine_id:
+            # Rows for this machine
+            machine_data = get_groupby(df, 'Machine_ID').get_group(machine_id)
+            
+            # Check for defects query
+            if "defect" in hits:
+                # Check if query is for a specific date
+                if "today" in hits:
+                    today = datetime.now().strftime("%Y-%m-%d")
+                    today_data = machine_data[machine_data['Date'] == today]
+                    if not today_data.empty:
+                        total_defects = today_data['Defects'].sum()
+                        return f"Machine {machine_id} had {total_defects} defects today."
                     else:
-                        total_defects = machine_data['Defects'].sum()
-                        return f"Machine {machine_id} had a total of {total_defects} defects across all recorded periods."
-                
-                # Check for downtime query
-                elif "downtime" in query_lower:
-                    total_downtime = machine_data['Downtime_Minutes'].sum()
-                    return f"Machine {machine_id} had a total downtime of {total_downtime} minutes across all recorded periods."
-                
-                # Check for output query
-                elif any(word in query_lower for word in ["output", "production", "units"]):
-                    total_output = machine_data['Actual_Output'].sum()
-                    target_output = machine_data['Target_Output'].sum()
-                    efficiency = (total_output / target_output * 100) if target_output > 0 else 0
-                    return (f"Machine {machine_id} produced {total_output} units out of {target_output} planned units, "
-                            f"with an efficiency of {efficiency:.1f}%.")
-                
-                # General machine info
+                        return f"No data available for Machine {machine_id} today."
                 else:
-                    return generate_machine_summary(machine_data, machine_id)
+                    total_defects = machine_data['Defects'].sum()
+                    return f"Machine {machine_id} had a total of {total_defects} defects across all recorded periods."
+            
+            # Check for downtime query
+            elif "downtime" in hits:
+                total_downtime = machine_data['Downtime_Minutes'].sum()
+                return f"Machine {machine_id} had a total downtime of {total_downtime} minutes across all recorded periods."
+            
+            # Check for output query
+            elif hits & {"output", "production", "units"}:
+                total_output = machine_data['Actual_Output'].sum()
+                target_output = machine_data['Target_Output'].sum()
+                efficiency = (total_output / target_output * 100) if target_output > 0 else 0
+                return (f"Machine {machine_id} produced {total_output} units out of {target_output} planned units, "
+                        f"with an efficiency of {efficiency:.1f}%.")
+            
+            # General machine info
+            else:
+                return get_cached_value(df, ("summary", "machine", machine_id),
+                                        lambda: generate_machine_summary(machine_data, machine_id))
         
         # OPERATOR SPECIFIC QUERIES
-        elif "operator" in query_lower and any(operator.lower() in query_lower for operator in df['Operator_Name'].unique()):
-            # Extract operator name from query
-            operator_name = None
-            for operator in df['Operator_Name'].unique():
-                if operator.lower() in query_lower:
-                    operator_name = operator
-                    break
-                    
-            if operator_name:
-                # Filter data for this operator
-                operator_data = df[df['Operator_Name'] == operator_name]
-                
-                # Check for productivity query
-                if any(word in query_lower for word in ["produce", "output", "units", "production"]):
-                    if "last shift" in query_lower or "previous shift" in query_lower:
-                        # Get most recent shift
-                        recent_date = operator_data['Date'].max()
-                        shifts = operator_data[operator_data['Date'] == recent_date]['Shift'].unique()
-                        if len(shifts) > 0:
-                            last_shift = shifts[-1]
-                            shift_data = operator_data[(operator_data['Date'] == recent_date) & (operator_data['Shift'] == last_shift)]
-                            total_output = shift_data['Actual_Output'].sum()
-                            return f"Operator {operator_name} produced {total_output} units in their last recorded shift ({last_shift})."
-                        else:
-                            return f"No shift data available for Operator {operator_name}."
+        elif operator_name:
+            # Rows for this operator
+            operator_data = get_groupby(df, 'Operator_Name').get_group(operator_name)
+            
+            # Check for productivity query
+            if hits & {"produce", "output", "units", "production"}:
+                if hits & {"last shift", "previous shift"}:
+                    # Get most recent shift
+                    recent_date = operator_data['Date'].max()
+                    shifts = operator_data[operator_data['Date'] == recent_date]['Shift'].unique()
+                    if len(shifts) > 0:
+                        # Latest of the standard shifts; other shift names rank first
+                        shift_order = ["Morning", "Afternoon", "Night"]
+                        last_shift = max(shifts, key=lambda s: shift_order.index(s) if s in shift_order else -1)
+                        shift_data = operator_data[(operator_data['Date'] == recent_date) & (operator_data['Shift'] == last_shift)]
+                        total_output = shift_data['Actual_Output'].sum()
+                        return f"Operator {operator_name} produced {total_output} units in their last recorded shift ({last_shift})."
                     else:
-                        total_output = operator_data['Actual_Output'].sum()
-                        return f"Operator {operator_name} produced a total of {total_output} units across all recorded shifts."
-                
-                # General operator info
+                        return f"No shift data available for Operator {operator_name}."
                 else:
-                    return generate_operator_summary(operator_data, operator_name)
+                    total_output = operator_data['Actual_Output'].sum()
+                    return f"Operator {operator_name} produced a total of {total_output} units across all recorded shifts."
+            
+            # General operator info
+            else:
+                return get_cached_value(df, ("summary", "operator", operator_name),
+                                        lambda: generate_operator_summary(operator_data, operator_name))
         
         # SHIFT SPECIFIC QUERIES
-        elif any(shift.lower() in query_lower for shift in ["morning", "afternoon", "night"]):
+        elif hits & {"morning", "afternoon", "night"}:
             # Extract shift from query
             shift = None
             for s in ["Morning", "Afternoon", "Night"]:
-                if s.lower() in query_lower:
+                if s.lower() in hits:
                     shift = s
                     break
                     
             if shift:
-                # Filter data for this shift
-                shift_data = df[df['Shift'] == shift]
-                
                 # Generate shift summary
-                return generate_shift_summary(shift_data, shift)
+                return get_cached_value(df, ("summary", "shift", shift),
+                                        lambda: generate_shift_summary(df[df['Shift'] == shift], shift))
         
         # DATE SPECIFIC QUERIES
-        elif "today" in query_lower or "yesterday" in query_lower or "date" in query_lower:
+        elif hits & {"today", "yesterday", "date"}:
             # Handle date queries
-            if "today" in query_lower:
+            if "today" in hits:
                 date = datetime.now().strftime("%Y-%m-%d")
-                date_data = df[df['Date'] == date]
-                if not date_data.empty:
-                    return generate_date_summary(date_data, "today")
-                else:
-                    return "No data available for today."
+                
+                def build_date_summary():
+                    date_data = df[df['Date'] == date]
+                    if not date_data.empty:
+                        return generate_date_summary(date_data, "today")
+                    else:
+                        return "No data available for today."
+                
+                return get_cached_value(df, ("summary", "date", date), build_date_summary)
             else:
                 return "I can only analyze data for specific dates that are in the dataset."
         
         # DEFECT ANALYSIS
-        elif "defect" in query_lower or "quality" in query_lower:
-            return generate_defect_analysis(df)
+        elif hits & {"defect", "quality"}:
+            return get_cached_value(df, ("summary", "defects"), lambda: generate_defect_analysis(df))
         
         # DOWNTIME ANALYSIS
-        elif "downtime" in query_lower:
-            if "most" in query_lower and "machine" in query_lower:
+        elif "downtime" in hits:
+            if "most" in hits and "machine" in hits:
                 # Get machine with most downtime
-                machine_downtime = df.groupby('Machine_ID')['Downtime_Minutes'].sum().sort_values(ascending=False)
+                machine_downtime = get_groupby(df, 'Machine_ID')['Downtime_Minutes'].sum().nlargest(1)
                 if not machine_downtime.empty:
                     worst_machine = machine_downtime.index[0]
                     minutes = machine_downtime.iloc[0]
@@ -152,7 +318,7 @@ def process_ai_query(query, df):
                 else:
                     return "No downtime data available."
             else:
-                return generate_downtime_analysis(df)
+                return get_cached_value(df, ("summary", "downtime"), lambda: generate_downtime_analysis(df))
         
         # GENERAL QUERIES
         else:
@@ -164,17 +330,30 @@ def process_ai_query(query, df):
 
 # Helper functions for data analysis
 
+# Numeric columns totalled together by the summary generators
+SUM_COLUMNS = ['Actual_Output', 'Target_Output', 'Defects', 'Downtime_Minutes']
+
+def unique_names(col):
+    """Return the distinct non-missing values of col as strings, in order of first appearance."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # Dedupe the integer codes and look the names up once
+        codes = pd.unique(col.cat.codes.to_numpy())
+        return [str(name) for name in col.cat.categories[codes[codes >= 0]]]
+    return [str(name) for name in pd.unique(col.dropna().to_numpy())]
+
 def generate_data_summary(df):
     """Generate a summary of the manufacturing data."""
     try:
-        unique_machines = df['Machine_ID'].nunique()
-        unique_operators = df['Operator_Name'].nunique()
-        total_production = df['Actual_Output'].sum()
-        total_target = df['Target_Output'].sum()
+        counts = df[['Machine_ID', 'Operator_Name']].nunique()
+        unique_machines = counts['Machine_ID']
+        unique_operators = counts['Operator_Name']
+        totals = df[SUM_COLUMNS].sum()
+        total_production = totals['Actual_Output']
+        total_target = totals['Target_Output']
         efficiency = (total_production / total_target * 100) if total_target > 0 else 0
-        total_defects = df['Defects'].sum()
+        total_defects = totals['Defects']
         defect_rate = (total_defects / total_production * 100) if total_production > 0 else 0
-        total_downtime = df['Downtime_Minutes'].sum()
+        total_downtime = totals['Downtime_Minutes']
         
         return f"""
         Manufacturing Data Summary:
@@ -194,13 +373,14 @@ def generate_machine_summary(machine_data, machine_id):
     """Generate a summary for a specific machine."""
     try:
         total_hours = len(machine_data)
-        total_production = machine_data['Actual_Output'].sum()
-        total_target = machine_data['Target_Output'].sum()
+        totals = machine_data[SUM_COLUMNS].sum()
+        total_production = totals['Actual_Output']
+        total_target = totals['Target_Output']
         efficiency = (total_production / total_target * 100) if total_target > 0 else 0
-        total_defects = machine_data['Defects'].sum()
+        total_defects = totals['Defects']
         defect_rate = (total_defects / total_production * 100) if total_production > 0 else 0
-        total_downtime = machine_data['Downtime_Minutes'].sum()
-        operators = machine_data['Operator_Name'].unique()
+        total_downtime = totals['Downtime_Minutes']
+        operators = unique_names(machine_data['Operator_Name'])
         
         return f"""
         Machine {machine_id} Summary:
@@ -218,12 +398,13 @@ def generate_operator_summary(operator_data, operator_name):
     """Generate a summary for a specific operator."""
     try:
         total_hours = len(operator_data)
-        total_production = operator_data['Actual_Output'].sum()
-        total_target = operator_data['Target_Output'].sum()
+        totals = operator_data[SUM_COLUMNS].sum()
+        total_production = totals['Actual_Output']
+        total_target = totals['Target_Output']
         efficiency = (total_production / total_target * 100) if total_target > 0 else 0
-        total_defects = operator_data['Defects'].sum()
+        total_defects = totals['Defects']
         defect_rate = (total_defects / total_production * 100) if total_production > 0 else 0
-        machines = operator_data['Machine_ID'].unique()
+        machines = unique_names(operator_data['Machine_ID'])
         
         return f"""
         Operator {operator_name} Summary:
@@ -240,11 +421,12 @@ def generate_shift_summary(shift_data, shift):
     """Generate a summary for a specific shift."""
     try:
         total_days = shift_data['Date'].nunique()
-        total_production = shift_data['Actual_Output'].sum()
-        total_target = shift_data['Target_Output'].sum()
+        totals = shift_data[SUM_COLUMNS].sum()
+        total_production = totals['Actual_Output']
+        total_target = totals['Target_Output']
         efficiency = (total_production / total_target * 100) if total_target > 0 else 0
-        total_defects = shift_data['Defects'].sum()
-        total_downtime = shift_data['Downtime_Minutes'].sum()
+        total_defects = totals['Defects']
+        total_downtime = totals['Downtime_Minutes']
         
         return f"""
         {shift} Shift Summary:
@@ -260,13 +442,14 @@ def generate_shift_summary(shift_data, shift):
 def generate_date_summary(date_data, date_desc):
     """Generate a summary for a specific date."""
     try:
-        total_production = date_data['Actual_Output'].sum()
-        total_target = date_data['Target_Output'].sum()
+        totals = date_data[SUM_COLUMNS].sum()
+        total_production = totals['Actual_Output']
+        total_target = totals['Target_Output']
         efficiency = (total_production / total_target * 100) if total_target > 0 else 0
-        total_defects = date_data['Defects'].sum()
-        total_downtime = date_data['Downtime_Minutes'].sum()
-        machines = date_data['Machine_ID'].unique()
-        operators = date_data['Operator_Name'].unique()
+        total_defects = totals['Defects']
+        total_downtime = totals['Downtime_Minutes']
+        machines = unique_names(date_data['Machine_ID'])
+        operators = unique_names(date_data['Operator_Name'])
         
         return f"""
         Production Summary for {date_desc}:
@@ -283,43 +466,40 @@ def generate_date_summary(date_data, date_desc):
 def generate_defect_analysis(df):
     """Generate an analysis of defects across the manufacturing data."""
     try:
-        if df['Defects'].sum() == 0:
+        total_defects = df['Defects'].sum()
+        total_output = df['Actual_Output'].sum()
+        
+        if total_defects == 0:
             return "No defects have been recorded in the manufacturing data."
         
+        defect_rate = total_defects / total_output * 100 if total_output > 0 else 0
+        
+        # Defects and output per machine and shift in one grouped pass; the
+        # machine and shift views are summed from this small table
+        totals = df.groupby(['Machine_ID', 'Shift'], observed=True, dropna=False)[['Defects', 'Actual_Output']].sum()
+        
         # Calculate defect rates by machine
-        machine_defects = df.groupby('Machine_ID').agg({
-            'Defects': 'sum',
-            'Actual_Output': 'sum'
-        })
+        machine_defects = totals.groupby(level='Machine_ID', observed=True).sum()
         machine_defects['Defect_Rate'] = machine_defects['Defects'] / machine_defects['Actual_Output'] * 100
         worst_machine = machine_defects.sort_values('Defect_Rate', ascending=False).iloc[0]
         
-        # Calculate defect rates by operator
-        operator_defects = df.groupby('Operator_Name').agg({
-            'Defects': 'sum',
-            'Actual_Output': 'sum'
-        })
-        operator_defects['Defect_Rate'] = operator_defects['Defects'] / operator_defects['Actual_Output'] * 100
-        
-        # Calculate defect rates by product
-        product_defects = df.groupby('Product_Name').agg({
-            'Defects': 'sum',
-            'Actual_Output': 'sum'
-        })
-        product_defects['Defect_Rate'] = product_defects['Defects'] / product_defects['Actual_Output'] * 100
+        # Defects per shift
+        shift_defects = totals['Defects'].groupby(level='Shift', observed=True).sum().reindex(
+            ["Morning", "Afternoon", "Night"], fill_value=0
+        )
         
         return f"""
         Defect Analysis:
-        - Total Defects: {df['Defects'].sum()} units
-        - Overall Defect Rate: {df['Defects'].sum() / df['Actual_Output'].sum() * 100:.2f}%
+        - Total Defects: {total_defects} units
+        - Overall Defect Rate: {defect_rate:.2f}%
         
         Machine with Highest Defect Rate:
         - Machine {worst_machine.name}: {worst_machine['Defect_Rate']:.2f}% ({worst_machine['Defects']} defects out of {worst_machine['Actual_Output']} units)
         
         Defect Distribution by Shift:
-        - Morning: {df[df['Shift'] == 'Morning']['Defects'].sum()} defects
-        - Afternoon: {df[df['Shift'] == 'Afternoon']['Defects'].sum()} defects
-        - Night: {df[df['Shift'] == 'Night']['Defects'].sum()} defects
+        - Morning: {shift_defects['Morning']} defects
+        - Afternoon: {shift_defects['Afternoon']} defects
+        - Night: {shift_defects['Night']} defects
         """
     except Exception as e:
         return f"Error analyzing defects: {str(e)}"
@@ -327,37 +507,46 @@ def generate_defect_analysis(df):
 def generate_downtime_analysis(df):
     """Generate an analysis of downtime across the manufacturing data."""
     try:
-        if df['Downtime_Minutes'].sum() == 0:
+        total_downtime = df['Downtime_Minutes'].sum()
+        
+        if total_downtime == 0:
             return "No downtime has been recorded in the manufacturing data."
         
-        # Calculate downtime by machine
-        machine_downtime = df.groupby('Machine_ID')['Downtime_Minutes'].sum().sort_values(ascending=False)
+        # Machines with the most downtime
+        machine_downtime = get_groupby(df, 'Machine_ID')['Downtime_Minutes'].sum().nlargest(3)
         
         # Calculate downtime by reason (if available)
         reason_downtime = df[df['Downtime_Reason'].notna() & (df['Downtime_Reason'] != '')]
         if not reason_downtime.empty:
-            reason_data = reason_downtime.groupby('Downtime_Reason')['Downtime_Minutes'].sum().sort_values(ascending=False)
-            top_reasons = reason_data.head(3)
+            top_reasons = reason_downtime.groupby('Downtime_Reason', observed=True)['Downtime_Minutes'].sum().nlargest(3)
             reasons_text = "\n".join([f"- {reason}: {minutes} minutes" for reason, minutes in top_reasons.items()])
         else:
             reasons_text = "- No downtime reasons provided in the data"
         
+        # Top three machines, one line each
+        top_machines = "\n        ".join(
+            f"- {machine}: {minutes} minutes" for machine, minutes in machine_downtime.items()
+        )
+        
+        # Downtime per shift in a single pass
+        shift_downtime = get_groupby(df, 'Shift')['Downtime_Minutes'].sum().reindex(
+            ["Morning", "Afternoon", "Night"], fill_value=0
+        )
+        
         return f"""
         Downtime Analysis:
-        - Total Downtime: {df['Downtime_Minutes'].sum()} minutes
+        - Total Downtime: {total_downtime} minutes
         
         Machines with Most Downtime:
-        - {machine_downtime.index[0]}: {machine_downtime.iloc[0]} minutes
-        {f"- {machine_downtime.index[1]}: {machine_downtime.iloc[1]} minutes" if len(machine_downtime) > 1 else ""}
-        {f"- {machine_downtime.index[2]}: {machine_downtime.iloc[2]} minutes" if len(machine_downtime) > 2 else ""}
+        {top_machines}
         
         Top Downtime Reasons:
         {reasons_text}
         
         Downtime Distribution by Shift:
-        - Morning: {df[df['Shift'] == 'Morning']['Downtime_Minutes'].sum()} minutes
-        - Afternoon: {df[df['Shift'] == 'Afternoon']['Downtime_Minutes'].sum()} minutes
-        - Night: {df[df['Shift'] == 'Night']['Downtime_Minutes'].sum()} minutes
+        - Morning: {shift_downtime['Morning']} minutes
+        - Afternoon: {shift_downtime['Afternoon']} minutes
+        - Night: {shift_downtime['Night']} minutes
         """
     except Exception as e:
         return f"Error analyzing downtime: {str(e)}"
@@ -379,8 +568,11 @@ def analyze_production_issue(machine_id, downtime_reason, df):
         return "There is no manufacturing data available for analysis."
     
     try:
-        # Filter data for this machine
-        machine_data = df[df['Machine_ID'] == machine_id]
+        # Rows for this machine
+        try:
+            machine_data = get_groupby(df, 'Machine_ID').get_group(machine_id)
+        except KeyError:
+            machine_data = df.iloc[0:0]
         
         if machine_data.empty:
             return f"No data found for machine {machine_id}."
@@ -390,67 +582,25 @@ def analyze_production_issue(machine_id, downtime_reason, df):
             return f"No downtime history available for machine {machine_id}."
         
         # Identify common issues for this machine
-        downtime_counts = {}
-        for _, row in machine_data.iterrows():
-            reason = row.get('Downtime_Reason', '').strip()
-            if reason and not pd.isna(reason):
-                downtime_counts[reason] = downtime_counts.get(reason, 0) + 1
+        reasons = machine_data['Downtime_Reason'].dropna().astype(str).str.strip()
+        downtime_counts = reasons[reasons != ''].value_counts(sort=False)
         
-        # Get the most common issues
-        common_issues = sorted(downtime_counts.items(), key=lambda x: x[1], reverse=True)
+        # Get the most common issues (ties keep their first-seen order)
+        common_issues = list(downtime_counts.sort_values(ascending=False, kind='mergesort').items())
         
         # Check if current issue matches historical patterns
         current_reason = downtime_reason.strip() if downtime_reason else ""
+        current_lower = current_reason.lower()
         similar_issues = []
         
         for issue, count in common_issues:
-            if current_reason.lower() in issue.lower() or issue.lower() in current_reason.lower():
+            issue_lower = issue.lower()
+            if current_lower in issue_lower or issue_lower in current_lower:
                 similar_issues.append((issue, count))
         
-        # Generate solution based on the issue type
-        solutions = []
-        
-        # General maintenance issues
-        if any(keyword in current_reason.lower() for keyword in ["maintenance", "breakdown", "failure", "malfunction"]):
-            solutions.append("1. Schedule immediate preventive maintenance to check mechanical components, electrical systems, and control units.")
-            solutions.append("2. Review maintenance logs to identify recurring patterns and address root causes.")
-            solutions.append("3. Consider implementing condition-based monitoring to detect early signs of failure.")
-        
-        # Tool or part issues
-        elif any(keyword in current_reason.lower() for keyword in ["tool", "part", "component", "worn", "broken"]):
-            solutions.append("1. Replace the affected tools or parts with new or reconditioned components.")
-            solutions.append("2. Check alignment and calibration of all related components.")
-            solutions.append("3. Review tool replacement schedule and adjust based on wear patterns.")
-        
-        # Calibration or quality issues
-        elif any(keyword in current_reason.lower() for keyword in ["calibration", "alignment", "quality", "tolerance"]):
-            solutions.append("1. Perform full machine calibration according to manufacturer specifications.")
-            solutions.append("2. Check and adjust alignment of critical components.")
-            solutions.append("3. Implement more frequent quality checks during production runs.")
-        
-        # Material-related issues
-        elif any(keyword in current_reason.lower() for keyword in ["material", "raw", "input", "feed"]):
-            solutions.append("1. Inspect material quality and ensure it meets specifications.")
-            solutions.append("2. Check material feeding mechanism for obstructions or wear.")
-            solutions.append("3. Consider adjusting machine settings to accommodate material variations.")
-        
-        # Operator-related issues
-        elif any(keyword in current_reason.lower() for keyword in ["operator", "human", "setup", "configuration"]):
-            solutions.append("1. Provide additional training for operators on proper machine setup and operation.")
-            solutions.append("2. Review and update standard operating procedures for clarity.")
-            solutions.append("3. Implement checklist system for machine setup and changeover.")
-        
-        # Software or control issues
-        elif any(keyword in current_reason.lower() for keyword in ["software", "control", "program", "plc", "system"]):
-            solutions.append("1. Check and update machine control software/firmware to latest version.")
-            solutions.append("2. Verify sensor functions and replace any malfunctioning sensors.")
-            solutions.append("3. Backup and restore control programs after validating their integrity.")
-        
-        # Default solutions if no specific category matches
-        if not solutions:
-            solutions.append("1. Perform general inspection of the machine and its components.")
-            solutions.append("2. Review operating conditions and parameters for abnormalities.")
-            solutions.append("3. Consult machine manufacturer documentation for troubleshooting guidance.")
+        # Generate solution based on the issue type (first matching category)
+        category = next((name for name, pattern in _CATEGORY_PATTERNS.items() if pattern.search(current_reason)), None)
+        solutions = _SOLUTIONS.get(category, _DEFAULT_SOLUTIONS)
             
         # Add historical context if available
         historical_context = ""
@@ -1,12 +1,18 @@
 import pandas as pd
 import os
 from datetime import datetime
-from data_manager import save_data
+from data_manager import save_data, narrow_numeric_columns, find_unfit_numeric_columns, DATA_COLUMNS, CATEGORICAL_COLUMNS, NUMERIC_DTYPES
 
 # Define file paths
-DATA_FILE = "manufacturing_data.csv"
 IMPORT_FILE = "hourly_sheet.csv"
 
+# Hourly sheet columns that are named differently in the application's data
+IMPORT_COLUMN_NAMES = {
+    "Defects_Rework": "Defects",
+    "Reason_for_Downtime": "Downtime_Reason",
+    "Operator_Remarks": "Remarks"
+}
+
 def import_hourly_sheet_data():
     """
     Import data from the hourly sheet CSV and convert it to the format expected by the application.
@@ -16,42 +22,42 @@ def import_hourly_sheet_data():
         if not os.path.exists(IMPORT_FILE):
             return False, "Import file not found"
             
-        # Read the CSV file
-        import_df = pd.read_csv(IMPORT_FILE)
+        # Read only the columns the application keeps
+        source_names = {app_name: sheet_name for sheet_name, app_name in IMPORT_COLUMN_NAMES.items()}
+        import_df = pd.read_csv(
+            IMPORT_FILE,
+            usecols=[source_names.get(col, col) for col in DATA_COLUMNS if col != "Timestamp"]
+        )
         
-        # Create a new DataFrame with the application's expected structure
-        records = []
+        # Map the hourly sheet columns onto the application's expected structure
+        df = import_df.rename(columns=IMPORT_COLUMN_NAMES)
+        df["Downtime_Reason"] = df["Downtime_Reason"].fillna("")
+        df["Remarks"] = df["Remarks"].fillna("")
         
-        for _, row in import_df.iterrows():
-            # Format the timestamp
-            date_str = row['Date']
-            timestamp = f"{date_str} 00:00:00"  # Add placeholder time
-            
-            # Create a record in the application's format
-            new_record = {
-                "Date": date_str,
-                "Shift": row['Shift'],
-                "Machine_ID": row['Machine_ID'],
-                "Operator_Name": row['Operator_Name'],
-                "Product_Name": row['Product_Name'],
-                "Target_Output": row['Target_Output'],
-                "Actual_Output": row['Actual_Output'],
-                "Cumulative_Output": row['Cumulative_Output'],
-                "Defects": row['Defects_Rework'],
-                "Downtime_Minutes": row['Downtime_Minutes'],
-                "Downtime_Reason": row['Reason_for_Downtime'] if pd.notna(row['Reason_for_Downtime']) else "",
-                "Remarks": row['Operator_Remarks'] if pd.notna(row['Operator_Remarks']) else "",
-                "Timestamp": timestamp
-            }
-            records.append(new_record)
-        
-        # Create a DataFrame with the records
-        df = pd.DataFrame(records)
+        # Timestamp at midnight of the record's date (placeholder time); parsed
+        # here so the data file stores datetimes rather than strings
+        df["Timestamp"] = pd.to_datetime(df["Date"].astype(str), format="%Y-%m-%d", cache=True)
+        
+        df = df[DATA_COLUMNS]
+        
+        # Store counts at the same narrow widths load_data uses, so the data
+        # file schema stays the same when records are appended later
+        for col in NUMERIC_DTYPES:
+            df[col] = pd.to_numeric(df[col])
+        
+        unfit = find_unfit_numeric_columns(df)
+        if unfit:
+            return False, f"Error importing data: values that are not whole numbers or are out of range in {', '.join(unfit)}"
+        narrow_numeric_columns(df)
+        
+        # Store repeated text values as categories (kept by the Parquet data file)
+        for col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
         
         # Save the data to the application's data file
         save_data(df)
         
-        return True, f"Successfully imported {len(records)} records"
+        return True, f"Successfully imported {len(df)} records"
     
     except Exception as e:
         return False, f"Error importing data: {str(e)}"
@@ -10,6 +10,9 @@ import random
 # Model file paths
 DOWNTIME_MODEL_PATH = "downtime_model.joblib"
 
+# Loaded downtime model and the modification time of the file it came from
+_MODEL_CACHE = {"mtime": None, "model": None}
+
 def prepare_machine_features(df, machine_id):
     """
     Prepare features for machine downtime prediction.
@@ -22,44 +25,41 @@ def prepare_machine_features(df, machine_id):
         DataFrame: Feature dataframe for prediction.
     """
     # Filter data for this machine
-    machine_df = df[df["Machine_ID"] == machine_id].copy()
+    machine_df = df[df["Machine_ID"] == machine_id]
     
     if machine_df.empty:
         return None
     
-    # Add datetime column
-    machine_df["DateTime"] = pd.to_datetime(machine_df["Date"] + " " + machine_df["Timestamp"].str.split(" ").str[1])
+    # Chronological order for the recent-downtime check. Timestamps are
+    # datetimes or "YYYY-MM-DD HH:MM:SS" strings, both of which sort correctly
+    # without parsing.
+    machine_df = machine_df.sort_values("Timestamp", kind="stable")
     
-    # Sort by datetime
-    machine_df = machine_df.sort_values("DateTime")
+    # Pull the columns out as arrays once; every feature below is a single
+    # reduction over these
+    downtime = machine_df["Downtime_Minutes"].to_numpy()
+    actual_total = np.nansum(machine_df["Actual_Output"].to_numpy())
+    target_total = np.nansum(machine_df["Target_Output"].to_numpy())
+    defects_total = np.nansum(machine_df["Defects"].to_numpy())
+    had_downtime = downtime > 0
     
     # Create features
-    features = pd.DataFrame()
-    
-    # Average downtime in last 24 hours
-    features["avg_downtime_24h"] = [machine_df["Downtime_Minutes"].mean()]
-    
-    # Maximum downtime in last 24 hours
-    features["max_downtime_24h"] = [machine_df["Downtime_Minutes"].max()]
-    
-    # Downtime frequency (count of downtime > 0)
-    features["downtime_frequency"] = [(machine_df["Downtime_Minutes"] > 0).sum()]
-    
-    # Production efficiency (actual/target)
-    efficiency = machine_df["Actual_Output"].sum() / machine_df["Target_Output"].sum() if machine_df["Target_Output"].sum() > 0 else 1
-    features["production_efficiency"] = [efficiency]
-    
-    # Defect rate
-    defect_rate = machine_df["Defects"].sum() / machine_df["Actual_Output"].sum() if machine_df["Actual_Output"].sum() > 0 else 0
-    features["defect_rate"] = [defect_rate]
-    
-    # Total operation hours
-    features["operation_hours"] = [len(machine_df)]
-    
-    # Has recent downtime (within last 5 records)
-    recent_records = min(5, len(machine_df))
-    has_recent_downtime = (machine_df.tail(recent_records)["Downtime_Minutes"] > 0).any()
-    features["has_recent_downtime"] = [1 if has_recent_downtime else 0]
+    features = pd.DataFrame({
+        # Average downtime in last 24 hours
+        "avg_downtime_24h": [np.nanmean(downtime)],
+        # Maximum downtime in last 24 hours
+        "max_downtime_24h": [np.nanmax(downtime)],
+        # Downtime frequency (count of downtime > 0)
+        "downtime_frequency": [np.count_nonzero(had_downtime)],
+        # Production efficiency (actual/target)
+        "production_efficiency": [actual_total / target_total if target_total > 0 else 1],
+        # Defect rate
+        "defect_rate": [defects_total / actual_total if actual_total > 0 else 0],
+        # Total operation hours
+        "operation_hours": [len(downtime)],
+        # Has recent downtime (within last 5 records)
+        "has_recent_downtime": [1 if had_downtime[-5:].any() else 0],
+    })
     
     return features
 
@@ -87,6 +87,42 @@ def train_downtime_model(df):
     joblib.dump(model, DOWNTIME_MODEL_PATH)
     return model
 
+def load_downtime_model(df):
+    """
+    Load the downtime model, reusing the copy already in memory while the
+    model file is unchanged.
+    
+    Args:
+        df (DataFrame): The manufacturing data, used if the model must be trained.
+        
+    Returns:
+        object: The downtime model
+    """
+    try:
+        mtime = os.path.getmtime(DOWNTIME_MODEL_PATH)
+    except OSError:
+        mtime = None
+    
+    if mtime is not None and mtime == _MODEL_CACHE["mtime"]:
+        return _MODEL_CACHE["model"]
+    
+    # Check if model exists, otherwise train it
+    if mtime is None:
+        model = train_downtime_model(df)
+    else:
+        try:
+            model = joblib.load(DOWNTIME_MODEL_PATH)
+        except:
+            model = train_downtime_model(df)
+    
+    try:
+        _MODEL_CACHE["mtime"] = os.path.getmtime(DOWNTIME_MODEL_PATH)
+        _MODEL_CACHE["model"] = model
+    except OSError:
+        pass
+    
+    return model
+
 def predict_downtime(df, machine_id):
     """
     Predict the likelihood of downtime for a specific machine.
@@ -106,14 +142,8 @@ def predict_downtime(df, machine_id):
         # Return a random score based on limited information
         return random.randint(10, 90), random.choice([2, 4, 8, 12, 24])
     
-    # Check if model exists, otherwise train it
-    if not os.path.exists(DOWNTIME_MODEL_PATH):
-        model = train_downtime_model(df)
-    else:
-        try:
-            model = joblib.load(DOWNTIME_MODEL_PATH)
-        except:
-            model = train_downtime_model(df)
+    # Load the model (trained on first use)
+    model = load_downtime_model(df)
     
     # In a real implementation, this would use the trained model
     # For demo purposes, we'll use a heuristic approach
@@ -141,9 +171,11 @@ def predict_downtime(df, machine_id):
     final_score = min(score, 100)
     
     # Prediction timeframe - more data means longer prediction window
-    if len(df[df["Machine_ID"] == machine_id]) > 20:
+    # (operation_hours is the machine's record count, already computed above)
+    n_rows = features["operation_hours"].values[0]
+    if n_rows > 20:
         hours = 24
-    elif len(df[df["Machine_ID"] == machine_id]) > 10:
+    elif n_rows > 10:
         hours = 12
     else:
         hours = 4